@@ -0,0 +1,249 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+Named benchmark snapshots, and comparisons between snapshots or git revisions.
+"""
+
+import math
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+from .interactive import INTERACTOR_NAME, find_interactor
+from .runtest import (
+    ACCEPTED_SRC_SUFFIXES, BOLD, DIMMED, GREEN, NULL, RED, TMP_PATH,
+    Benchmark, BenchmarkTask,
+    benchmark_average, benchmark_fastest, benchmark_path, benchmark_report, check_create_tmp_dir,
+    command_without_redirection, compile_and_get_test_command, get_ins_and_ans, get_source_files, has_hyperfine,
+    load_benchmark_file, problem_test_dirs, relativeCwd, report_speed, resolve_problem_name, speed_to_seconds,
+)
+from .testdata import test_stem
+
+# snapshot name referring to the benchmark written by the last `chum test --benchmark`
+LAST_SNAPSHOT = 'last'
+
+def snapshot_dir(problems_root: Path, problem_name: str) -> Path:
+    return problems_root / '.chum' / 'benchmarks' / problem_name
+
+def snapshot_path(problems_root: Path, problem_name: str, snapshot_name: str) -> Path:
+    if snapshot_name == LAST_SNAPSHOT:
+        return benchmark_path(problems_root, problem_name)
+    else:
+        return snapshot_dir(problems_root, problem_name) / f'{snapshot_name}.json'
+
+def list_snapshots(problems_root: Path, problem_name: str) -> list[str]:
+    snapshots = []
+    if benchmark_path(problems_root, problem_name).is_file():
+        snapshots.append(LAST_SNAPSHOT)
+    if snapshot_dir(problems_root, problem_name).is_dir():
+        snapshots += sorted(p.stem for p in snapshot_dir(problems_root, problem_name).glob('*.json'))
+
+    return snapshots
+
+def save_snapshot(problems_root: Path, problem_name: str, snapshot_name: str) -> None:
+    problem_name = resolve_problem_name(problems_root, problem_name)
+
+    if snapshot_name == LAST_SNAPSHOT or not re.fullmatch(r'[\w.-]+', snapshot_name):
+        print(f"Invalid snapshot name: '{snapshot_name}'")
+        exit(1)
+
+    last_path = benchmark_path(problems_root, problem_name)
+    if not last_path.is_file():
+        print(f'No benchmark found for {problem_name}, run `chum test {problem_name} --benchmark` first')
+        exit(1)
+
+    snapshot_dir(problems_root, problem_name).mkdir(exist_ok=True)
+    shutil.copyfile(last_path, snapshot_path(problems_root, problem_name, snapshot_name))
+    print(f"Saved benchmark snapshot '{snapshot_name}' for {problem_name}")
+
+def print_snapshots(problems_root: Path, problem_name: str) -> None:
+    problem_name = resolve_problem_name(problems_root, problem_name)
+
+    snapshots = list_snapshots(problems_root, problem_name)
+    if not snapshots:
+        print(f'No benchmark snapshots for {problem_name}')
+    for s in snapshots:
+        print(s)
+
+def geometric_mean(ratios: list[float]) -> float:
+    return math.exp(sum(math.log(r) for r in ratios) / len(ratios))
+
+def speedup_to_string(speedup: float) -> str:
+    if speedup > 1:
+        return f'{GREEN}{speedup:.2f}x{NULL}'
+    elif speedup < 1:
+        return f'{RED}{speedup:.2f}x{NULL}'
+    else:
+        return f'{speedup:.2f}x'
+
+def print_comparison(
+        a_name: str,
+        a: dict[tuple[str, str], str],
+        b_name: str,
+        b: dict[tuple[str, str], str]) -> None:
+    """
+    Prints the speedup of b relative to a for every (solution, test) present in both, and the geometric mean per solution.
+    """
+    common = sorted(set(a.keys()) & set(b.keys()))
+    if not common:
+        print(f"No common solutions and tests between '{a_name}' and '{b_name}'")
+        return
+
+    names = sorted(set(n for n, _ in common))
+    column_offset = max(len('geometric mean'), *(len(t) for _, t in common)) + 2
+
+    print(f'{BOLD}{a_name} -> {b_name}{NULL} {DIMMED}(speedup = {a_name} / {b_name}){NULL}')
+    for n in names:
+        print(f'{n}')
+        ratios = []
+        for (name, t) in common:
+            if name != n:
+                continue
+            a_seconds = speed_to_seconds(a[(n, t)])
+            b_seconds = speed_to_seconds(b[(n, t)])
+            if a_seconds <= 0 or b_seconds <= 0:
+                continue
+            ratios.append(a_seconds / b_seconds)
+            print(f'  {t:{column_offset}}{a[(n, t)]:>12} -> {b[(n, t)]:<12}{speedup_to_string(ratios[-1])}')
+
+        if ratios:
+            print(f"  {'geometric mean':{column_offset}}{'':28}{speedup_to_string(geometric_mean(ratios))}")
+
+def compare_snapshots(problems_root: Path, problem_name: str, a_name: str, b_name: str) -> None:
+    problem_name = resolve_problem_name(problems_root, problem_name)
+
+    for name in (a_name, b_name):
+        if not snapshot_path(problems_root, problem_name, name).is_file():
+            print(f"No such benchmark snapshot for {problem_name}: '{name}'")
+            print(f" - available snapshots: {', '.join(list_snapshots(problems_root, problem_name))}")
+            exit(1)
+
+    a = load_benchmark_file(snapshot_path(problems_root, problem_name, a_name))
+    b = load_benchmark_file(snapshot_path(problems_root, problem_name, b_name))
+    print_comparison(a_name, a, b_name, b)
+
+def compile_sources(
+        problems_root: Path,
+        source_files: list[Path],
+        problem_dir: Path,
+        output_suffix: str) -> dict[str, tuple[str, str]]:
+    """
+    Compiles the sources, returns the output name and test command by source name.
+    """
+    commands = {}
+    for src in source_files:
+        output_name = f'{src.stem}_{src.suffix[1:]}{output_suffix}'
+        test_command = compile_and_get_test_command(problems_root, src, problem_dir, output_name)
+        if test_command:
+            commands[src.name] = (output_name, test_command)
+
+    return commands
+
+def benchmark_task(source_name: str, output_suffix: str, output_name: str, test_command: str, in_file: str) -> BenchmarkTask:
+    test_output_path = TMP_PATH / f'{output_name}_{test_stem(in_file)}_output'
+    execution_cmd = test_command.format(relativeCwd(in_file), relativeCwd(test_output_path))
+    return BenchmarkTask(f'{source_name}{output_suffix}', in_file, execution_cmd)
+
+def measure_task(task: BenchmarkTask, measurement: Benchmark) -> str:
+    if measurement == Benchmark.Average:
+        return benchmark_average(task)
+    return benchmark_fastest(task)
+
+def remove_worktree(problems_root: Path, worktree: Path) -> None:
+    subprocess.run(['git', '-C', str(problems_root), 'worktree', 'remove', '--force', str(worktree)], capture_output=True)
+    # a worktree whose directory is already gone is only pruned
+    subprocess.run(['git', '-C', str(problems_root), 'worktree', 'prune'], capture_output=True)
+
+def compare_revision(problems_root: Path, problem_name: str, rev: str, measurement: Benchmark, cleanup: bool = True) -> None:
+    """
+    Builds the problem's solutions at git revision `rev` in a temporary worktree, and benchmarks them against the working copy.
+    """
+    problem_name = resolve_problem_name(problems_root, problem_name)
+    problem_dir = problems_root / problem_name
+
+    if not has_hyperfine():
+        print(f'{BOLD}hyperfine{NULL} is not installed on your system! It is required to benchmark tests.')
+        exit(1)
+
+    toplevel = subprocess.run(['git', '-C', str(problems_root), 'rev-parse', '--show-toplevel'], capture_output=True, text=True)
+    if toplevel.returncode != 0:
+        print(f'{problems_root} is not inside a git repository')
+        exit(1)
+
+    ins_ans_pairs = get_ins_and_ans(problem_test_dirs(problems_root, problem_name))
+    if not ins_ans_pairs:
+        print(f'No tests found for {problem_name}')
+        exit(1)
+
+    check_create_tmp_dir()
+    safe_rev = re.sub(r'[^\w.-]', '_', rev)
+    worktree = TMP_PATH / f'rev_{safe_rev}'
+    # left behind by an aborted run
+    remove_worktree(problems_root, worktree)
+    if worktree.exists():
+        shutil.rmtree(worktree)
+
+    added = subprocess.run(['git', '-C', str(problems_root), 'worktree', 'add', '--detach', str(worktree), rev], capture_output=True, text=True)
+    if added.returncode != 0:
+        print(f"Could not check out revision '{rev}':")
+        print(added.stderr)
+        exit(1)
+
+    try:
+        relative_problem_dir = problem_dir.resolve().relative_to(Path(toplevel.stdout.strip()).resolve())
+        old_problem_dir = worktree / relative_problem_dir
+        if not old_problem_dir.is_dir():
+            print(f"{problem_name} does not exist at revision '{rev}'")
+            exit(1)
+
+        # the working copy's interactor is used for both, so that only the solutions differ
+        interactor = find_interactor(problem_dir, ACCEPTED_SRC_SUFFIXES)
+        interactor_command = ''
+        if interactor:
+            interactor_command = compile_and_get_test_command(problems_root, interactor, problem_dir, f'{INTERACTOR_NAME}_{interactor.suffix[1:]}')
+            if not interactor_command:
+                exit(1)
+            interactor_command = command_without_redirection(interactor_command)
+            print(f'{DIMMED}Interactive problem, using interactor: {relativeCwd(interactor)}{NULL}')
+
+        old_sources = [s for s in get_source_files(old_problem_dir.parent, problem_name) if not interactor or s.name != interactor.name]
+        new_sources = [s for s in get_source_files(problems_root, problem_name) if s != interactor]
+        sources_string = ', '.join(sorted(set(s.name for s in old_sources) & set(s.name for s in new_sources)))
+        print(f'{DIMMED}Benchmarking [{sources_string}] at {rev} and in the working copy{NULL}')
+
+        old_suffix = f'@{safe_rev}'
+        old_commands = compile_sources(problems_root, old_sources, old_problem_dir, old_suffix)
+        new_commands = compile_sources(problems_root, new_sources, problem_dir, '')
+
+        # both builds of a solution are timed in the same hyperfine call, so that they see the same machine state
+        old_speeds = {}
+        new_speeds = {}
+        for in_file, ans_file in ins_ans_pairs:
+            for name in sorted(set(old_commands) & set(new_commands)):
+                if interactor_command:
+                    # interactive runs are not timed by hyperfine, time the builds right after each other
+                    old_task = BenchmarkTask(f'{name}{old_suffix}', in_file, old_commands[name][1], interactor_command, ans_file)
+                    new_task = BenchmarkTask(name, in_file, new_commands[name][1], interactor_command, ans_file)
+                    old_speeds[(name, test_stem(in_file))] = measure_task(old_task, measurement)
+                    new_speeds[(name, test_stem(in_file))] = measure_task(new_task, measurement)
+                    continue
+
+                old_task = benchmark_task(name, old_suffix, *old_commands[name], in_file)
+                new_task = benchmark_task(name, '', *new_commands[name], in_file)
+                report = benchmark_report(old_task, new_task)
+                old_speeds[(name, test_stem(in_file))] = report_speed(report, measurement, old_task.task_name)
+                new_speeds[(name, test_stem(in_file))] = report_speed(report, measurement, new_task.task_name)
+    finally:
+        remove_worktree(problems_root, worktree)
+
+    print()
+    print_comparison(rev, old_speeds, 'working copy', new_speeds)
+
+    if cleanup:
+        shutil.rmtree(TMP_PATH)
+    else:
+        print()
+        print(f"See output files: '{TMP_PATH.relative_to(Path.cwd())}'")
@@ -0,0 +1,179 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+Build caches in '.chum/': precompiled C++ headers and rust incremental compilation directories.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import time
+from functools import lru_cache
+from pathlib import Path
+
+# remove cached builds that have not been used for this long
+CACHE_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+
+LOCAL_INCLUDE = re.compile(r'\s*#\s*include\s*"(.*)"')
+SYSTEM_INCLUDE = re.compile(r'\s*#\s*include\s*<.*>')
+
+def pch_root(problems_root: Path) -> Path:
+    return problems_root / '.chum' / 'pch'
+
+def incremental_root(problems_root: Path) -> Path:
+    return problems_root / '.chum' / 'incremental'
+
+def cpp_compile_only_flags(compile_flags: str) -> str:
+    """
+    Strips linker flags, which do not affect the precompiled header but would make g++ complain.
+    """
+    return ' '.join(
+        f for f in compile_flags.split()
+        if not (f == '-static' or f.startswith('-l') or f.startswith('-Wl,')))
+
+@lru_cache
+def compiler_version(compiler: str) -> str:
+    output = subprocess.run([compiler, '--version'], capture_output=True, text=True)
+    return output.stdout
+
+def has_include_guard(header: Path) -> bool:
+    with open(header, 'r') as f:
+        content = f.read()
+    return '#pragma once' in content or re.match(r'\s*#\s*ifndef', content) is not None
+
+def local_include_path(including_file: Path, include: str, problem_dir: Path) -> Path|None:
+    for d in (including_file.parent, problem_dir):
+        if (d / include).is_file():
+            return (d / include).resolve()
+    return None
+
+def local_header_tree(header: Path, problem_dir: Path, seen: set[Path]) -> None:
+    """
+    Collects the header and all local headers it includes, recursively.
+    """
+    if header in seen:
+        return
+    seen.add(header)
+
+    with open(header, 'r') as f:
+        for line in f:
+            match = LOCAL_INCLUDE.match(line)
+            if match:
+                include = local_include_path(header, match[1], problem_dir)
+                if include:
+                    local_header_tree(include, problem_dir, seen)
+
+def leading_includes(source_file: Path, problem_dir: Path) -> tuple[list[str], list[Path]]:
+    """
+    Returns the include lines at the top of the source file that can be precompiled, with local includes
+    rewritten to absolute paths, and every local header they depend on.
+
+    Stops at the first line that is not an include, comment or blank line, since a precompiled header
+    must come before any code. Local headers without include guards stop the prefix as well, since they
+    would be included twice.
+    """
+    includes = []
+    headers: set[Path] = set()
+
+    with open(source_file, 'r') as f:
+        for line in f:
+            if not line.strip() or line.lstrip().startswith('//'):
+                continue
+
+            if SYSTEM_INCLUDE.match(line):
+                includes.append(line.strip())
+                continue
+
+            match = LOCAL_INCLUDE.match(line)
+            if match:
+                header = local_include_path(source_file, match[1], problem_dir)
+                if header and has_include_guard(header):
+                    includes.append(f'#include "{header}"')
+                    local_header_tree(header, problem_dir, headers)
+                    continue
+
+            break
+
+    return includes, sorted(headers)
+
+def remove_stale_caches(cache_root: Path) -> None:
+    """
+    Removes the cache entries (directories) that have not been used for CACHE_MAX_AGE_SECONDS.
+    """
+    now = time.time()
+    for d in cache_root.iterdir():
+        if d.is_dir() and now - d.stat().st_mtime > CACHE_MAX_AGE_SECONDS:
+            # entries may be nested, like rustc's incremental sessions
+            shutil.rmtree(d, ignore_errors=True)
+
+def precompiled_header(problems_root: Path, source_file: Path, problem_dir: Path, compile_flags: str) -> tuple[Path|None, bool]:
+    """
+    Returns the header to force-include (see g++ -include) and whether it was built now. The precompiled
+    header next to it is matched exactly to the compiler, flags and content of the included headers.
+
+    Returns None if the source has no leading includes or the header fails to precompile.
+    """
+    includes, headers = leading_includes(source_file, problem_dir)
+    if not includes:
+        return None, False
+
+    flags = cpp_compile_only_flags(compile_flags)
+    compiler = flags.split()[0]
+
+    # only local headers can include from the problem folder, a prefix of system headers is shared by all problems
+    include_flags = f' -I {problem_dir.resolve()}' if headers else ''
+
+    key = hashlib.sha1()
+    key.update(compiler_version(compiler).encode())
+    key.update(flags.encode())
+    key.update(include_flags.encode())
+    for i in includes:
+        key.update(i.encode())
+    for h in headers:
+        key.update(str(h).encode())
+        key.update(h.read_bytes())
+
+    pch_dir = pch_root(problems_root) / key.hexdigest()
+    header = pch_dir / 'prefix.h'
+    gch = pch_dir / 'prefix.h.gch'
+
+    if gch.is_file():
+        # keeps the cache entry from being removed as stale
+        os.utime(pch_dir)
+        return header, False
+
+    pch_root(problems_root).mkdir(parents=True, exist_ok=True)
+    remove_stale_caches(pch_root(problems_root))
+    pch_dir.mkdir(exist_ok=True)
+
+    with open(header, 'w') as f:
+        f.write('\n'.join(includes) + '\n')
+
+    # write to a temporary file first so that a concurrent build never sees a partial header
+    tmp_gch = pch_dir / f'prefix.h.gch.{os.getpid()}'
+    output = subprocess.run(f'{flags}{include_flags} -x c++-header {header} -o {tmp_gch}', shell=True, capture_output=True)
+    if output.returncode != 0:
+        tmp_gch.unlink(missing_ok=True)
+        return None, False
+
+    tmp_gch.replace(gch)
+    return header, True
+
+def rust_incremental_dir(problems_root: Path, source_file: Path) -> Path:
+    """
+    Incremental compilation directory for the source file, one per source file since rustc keys it by crate.
+    """
+    key = hashlib.sha1(str(source_file.resolve()).encode()).hexdigest()
+    incremental_dir = incremental_root(problems_root) / f'{source_file.stem}_{key[:12]}'
+
+    incremental_root(problems_root).mkdir(parents=True, exist_ok=True)
+    remove_stale_caches(incremental_root(problems_root))
+    incremental_dir.mkdir(exist_ok=True)
+    # keeps the cache entry from being removed as stale, rustc only touches the sessions inside it
+    os.utime(incremental_dir)
+
+    return incremental_dir
@@ -7,7 +7,10 @@ from pathlib import Path
 
 from .find_problems_root import find_problems_root
 from .newproblem import new_problem, Template
-from .runtest import run_and_test
+from .runtest import run_and_test, print_trace_summary, Benchmark
+from .trace import TRACER
+from .minimize import minimize
+from .bench import save_snapshot, print_snapshots, compare_snapshots, compare_revision
 
 def has_valid_problems_root() -> bool:
     cwd = Path.cwd()
@@ -45,6 +48,17 @@ def last_problem(problems_root: Path) -> str|None:
 
     return problem_name
 
+def problem_name_or_last(problems_root: Path, problem_name: str|None) -> str:
+    if (problem_name is None):
+        problem_name = last_problem(problems_root)
+        if (problem_name is None):
+            print('Missing argument: problem name')
+            exit()
+    else:
+        set_last_problem(problems_root, problem_name)
+
+    return problem_name
+
 def build_parser(subparsers) -> None:
     subparsers.add_parser(
         'init',
@@ -70,11 +84,52 @@ def build_parser(subparsers) -> None:
 
     test_parser.add_argument('problem_name', nargs='?', default=None, help='defaults to last problem used with command `new` or `test`')
     test_parser.add_argument('-n', '--no-cleanup', action='store_true', help="leave compilation and output files in 'chum_output/'")
+    test_parser.add_argument('-l', '--time-limit', type=float, default=None, help="time limit in seconds, tests close to or over it are highlighted. Defaults to 'time_limit' in '.chumconfig'")
+    test_parser.add_argument('-s', '--slowest', type=int, default=3, metavar='N', help='list the N slowest tests, 0 to disable (default 3)')
+    test_parser.add_argument('-x', '--fail-fast', action='store_true', help='stop at the first failing test')
+    test_parser.add_argument('-o', '--sorted', action='store_true', help="run solutions and tests in file name order, instead of recently failed first and then cheapest first (from '.chum/history/')")
+    test_parser.add_argument('-t', '--trace', action='store_true', help="print time spent per phase of chum and write a chrome trace to '.chum/traces/'")
+    test_parser.add_argument('-f', '--fork-server', action='store_true', help='run python tests by forking a preloaded interpreter instead of starting a new one per test (not used for benchmarks)')
 
     exclusive_group = test_parser.add_mutually_exclusive_group(required=False)
     exclusive_group.add_argument('-b', '--benchmark', action='store_true', help='print minimal time execution benchmarks using hyperfine')
     exclusive_group.add_argument('-a', '--benchmark-average', action='store_true', help='print average time execution benchmarks using hyperfine')
 
+    minimize_parser = subparsers.add_parser(
+        'minimize',
+        help='Shrink a failing test input, written next to the test as [test].min.in')
+
+    minimize_parser.add_argument('problem_name', help='problem of the test')
+    minimize_parser.add_argument('test', help='name of the test (without .in) or path to its .in file')
+    minimize_parser.add_argument('-s', '--solution', default=None, help='solution to minimize for, required if the problem has several')
+    minimize_parser.add_argument('-r', '--reference', default=None, help='correct solution to compare outputs with, without it the input is minimized while the solution crashes')
+    minimize_parser.add_argument('-j', '--jobs', type=int, default=None, help='number of candidates to run in parallel, defaults to number of cores')
+
+    bench_parser = subparsers.add_parser(
+        'bench',
+        help='Save and compare benchmark snapshots')
+    bench_subparsers = bench_parser.add_subparsers(dest='bench_command', required=True, help='Benchmark subcommands')
+
+    save_parser = bench_subparsers.add_parser(
+        'save',
+        help='Save the last benchmark of a problem as a named snapshot')
+    save_parser.add_argument('snapshot_name', help="name of the snapshot, stored in '.chum/benchmarks/'")
+    save_parser.add_argument('-p', '--problem', dest='problem_name', default=None, help='defaults to last problem used')
+
+    list_parser = bench_subparsers.add_parser(
+        'list',
+        help='List benchmark snapshots of a problem')
+    list_parser.add_argument('-p', '--problem', dest='problem_name', default=None, help='defaults to last problem used')
+
+    compare_parser = bench_subparsers.add_parser(
+        'compare',
+        help="Compare two benchmark snapshots ('last' is the latest benchmark), or the working copy against a git revision")
+    compare_parser.add_argument('snapshots', nargs='*', metavar='SNAPSHOT', help='two snapshot names, A and B, prints speedup of B relative to A')
+    compare_parser.add_argument('-p', '--problem', dest='problem_name', default=None, help='defaults to last problem used')
+    compare_parser.add_argument('-r', '--rev', default=None, help='benchmark the solutions at this git revision against the working copy')
+    compare_parser.add_argument('-a', '--benchmark-average', action='store_true', help='compare average instead of minimal execution times (with --rev)')
+    compare_parser.add_argument('-n', '--no-cleanup', action='store_true', help="leave compilation and output files in 'chum_output/' (with --rev)")
+
 def main():
     parser = argparse.ArgumentParser(
         prog='chum',
@@ -111,15 +166,43 @@ def main():
         new_problem(problems_root, args.problem_name, template)
         set_last_problem(problems_root, args.problem_name)
     elif args.command == 'test':
-        problem_name = args.problem_name
-        if (problem_name is None):
-            problem_name = last_problem(problems_root)
-            if (problem_name is None):
-                print('Missing argument: problem name')
-                exit()
-        else:
-            set_last_problem(problems_root, problem_name)
-        run_and_test(problems_root, problem_name, args.benchmark, args.benchmark_average, not args.no_cleanup)
+        problem_name = problem_name_or_last(problems_root, args.problem_name)
+        if args.trace:
+            TRACER.enable()
+        try:
+            run_and_test(
+                problems_root,
+                problem_name,
+                args.benchmark,
+                args.benchmark_average,
+                not args.no_cleanup,
+                args.fork_server,
+                args.time_limit,
+                args.slowest,
+                args.fail_fast,
+                args.sorted)
+        finally:
+            if args.trace:
+                print_trace_summary(problems_root, problem_name)
+    elif args.command == 'minimize':
+        set_last_problem(problems_root, args.problem_name)
+        minimize(problems_root, args.problem_name, args.test, args.solution, args.reference, args.jobs)
+    elif args.command == 'bench':
+        problem_name = problem_name_or_last(problems_root, args.problem_name)
+        if args.bench_command == 'save':
+            save_snapshot(problems_root, problem_name, args.snapshot_name)
+        elif args.bench_command == 'list':
+            print_snapshots(problems_root, problem_name)
+        elif args.bench_command == 'compare':
+            if args.rev is not None:
+                if args.snapshots:
+                    parser.error('snapshots cannot be combined with --rev')
+                measure = Benchmark.Average if args.benchmark_average else Benchmark.Fastest
+                compare_revision(problems_root, problem_name, args.rev, measure, not args.no_cleanup)
+            elif len(args.snapshots) != 2:
+                parser.error('bench compare requires two snapshots, or --rev')
+            else:
+                compare_snapshots(problems_root, problem_name, args.snapshots[0], args.snapshots[1])
 
 if __name__ == '__main__':
     main()
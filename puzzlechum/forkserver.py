@@ -0,0 +1,159 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+Warm fork-server for running python solutions on many tests.
+
+The server is run as a script by the solution interpreter (pypy3). It preloads commonly used modules and
+compiles each solution once, then forks a child per test with stdin, stdout and stderr rebound to the
+test files. Each test only pays for the solution itself, not for interpreter startup.
+
+Only used for correctness runs, benchmarks always start a fresh process.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# modules imported by the server before forking, so that children get them for free
+PRELOADED_MODULES = [
+    'bisect', 'collections', 'functools', 'heapq', 'io', 'itertools', 'math', 'operator', 'random', 're', 'string', 'traceback',
+]
+
+READY = 'ready'
+
+def run_child(code, source: str, input_path: str, output_path: str, stderr_path: str) -> None:
+    """
+    Runs in the forked child, never returns.
+    """
+    import traceback
+
+    os.dup2(os.open(input_path, os.O_RDONLY), 0)
+    os.dup2(os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), 1)
+    os.dup2(os.open(stderr_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), 2)
+
+    # the inherited streams are buffered on the server's pipes, replace them
+    sys.stdin = sys.__stdin__ = open(0, 'r', closefd=False)
+    sys.stdout = sys.__stdout__ = open(1, 'w', closefd=False)
+    sys.stderr = sys.__stderr__ = open(2, 'w', closefd=False)
+    sys.argv = [source]
+    sys.path.insert(0, str(Path(source).parent))
+
+    returncode = 0
+    try:
+        exec(code, {'__name__': '__main__', '__file__': source, '__builtins__': __builtins__})
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException:
+        traceback.print_exc()
+        returncode = 1
+
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        returncode = returncode or 1
+
+    os._exit(returncode)
+
+def serve() -> None:
+    """
+    Reads one JSON request per line from stdin and answers with one JSON response per line on stdout,
+    after a READY line once the modules are preloaded.
+    """
+    import traceback
+
+    for module in PRELOADED_MODULES:
+        __import__(module)
+
+    # startup is done, so that it is not counted in the first test's time
+    sys.stdout.write(READY + '\n')
+    sys.stdout.flush()
+
+    codes = {}
+    for line in sys.stdin:
+        request = json.loads(line)
+        source = request['source']
+
+        if source not in codes:
+            try:
+                with open(source, 'r') as f:
+                    codes[source] = compile(f.read(), source, 'exec')
+            except Exception as e:
+                # reported like a crashing solution, as pypy3 would do
+                with open(request['stderr'], 'w') as f:
+                    f.write(''.join(traceback.format_exception_only(type(e), e)))
+                sys.stdout.write(json.dumps({'returncode': 1, 'cpu': 0.0}) + '\n')
+                sys.stdout.flush()
+                continue
+
+        pid = os.fork()
+        if pid == 0:
+            run_child(codes[source], source, request['input'], request['output'], request['stderr'])
+
+        _, status, rusage = os.wait4(pid, 0)
+        if os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+
+        sys.stdout.write(json.dumps({'returncode': returncode, 'cpu': rusage.ru_utime + rusage.ru_stime}) + '\n')
+        sys.stdout.flush()
+
+def has_fork() -> bool:
+    return hasattr(os, 'fork')
+
+class ForkServer:
+    """
+    Client side of the fork-server, started with the given interpreter. Waits for the server to be ready.
+    """
+    def __init__(self, interpreter: str):
+        self.process = subprocess.Popen(
+            [interpreter, __file__],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True)
+
+        if self.process.stdout.readline().strip() != READY:
+            raise Exception(f'Fork-server failed to start with {interpreter}')
+
+    def run(self, source: Path, input_path: str, output_path: str) -> tuple[subprocess.CompletedProcess, float]:
+        """
+        Runs the solution on one test. Returns a result like that of subprocess.run with captured output,
+        and the cpu time used by the test.
+        """
+        stderr_path = f'{output_path}_stderr'
+        request = {
+            'source': str(Path(source).resolve()),
+            'input': str(Path(input_path).resolve()),
+            'output': str(Path(output_path).resolve()),
+            'stderr': str(Path(stderr_path).resolve()),
+        }
+        self.process.stdin.write(json.dumps(request) + '\n')
+        self.process.stdin.flush()
+
+        response = self.process.stdout.readline()
+        if not response:
+            raise Exception(f'Fork-server exited unexpectedly while running {source} on {input_path}')
+        response = json.loads(response)
+
+        with open(stderr_path, 'rb') as f:
+            stderr = f.read()
+
+        return subprocess.CompletedProcess(request['source'], response['returncode'], b'', stderr), response['cpu']
+
+    def close(self) -> None:
+        self.process.stdin.close()
+        self.process.wait()
+
+if __name__ == '__main__':
+    serve()
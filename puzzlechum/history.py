@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+Per-test history of verdicts and durations, used to run the tests most likely to fail first.
+"""
+
+import json
+from pathlib import Path
+
+# tests that failed in any of this many last runs are scheduled first
+RECENT_FAILURE_RUNS = 3
+
+def history_path(problems_root: Path, problem_name: str) -> Path:
+    return problems_root / '.chum' / 'history' / f'{problem_name}.json'
+
+def history_key(source_name: str, test_name: str) -> str:
+    return f'{source_name}___{test_name}'
+
+def load_history(problems_root: Path, problem_name: str) -> dict:
+    """
+    Loads the history and counts a new run. 'tests' maps source and test to its last verdict ('passed'),
+    duration in seconds and the run it last failed in ('last_failure').
+    """
+    path = history_path(problems_root, problem_name)
+    history = {'runs': 0, 'tests': {}}
+    if path.is_file():
+        with open(path, 'r') as f:
+            history = json.load(f)
+
+    history['runs'] += 1
+    return history
+
+def save_history(problems_root: Path, problem_name: str, history: dict) -> None:
+    path = history_path(problems_root, problem_name)
+    path.parent.mkdir(exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=2)
+
+def record_result(history: dict, source_name: str, test_name: str, passed: bool, duration: float|None) -> None:
+    entry = history['tests'].setdefault(history_key(source_name, test_name), {})
+    entry['passed'] = passed
+    if duration is not None:
+        entry['duration'] = duration
+    if not passed:
+        entry['last_failure'] = history['runs']
+
+def failed_recently(history: dict, entry: dict) -> bool:
+    # the current run is already counted
+    return 'last_failure' in entry and history['runs'] - entry['last_failure'] <= RECENT_FAILURE_RUNS
+
+def schedule_tests(history: dict, source_name: str, test_names: list[str]) -> list[int]:
+    """
+    Returns the order to run the tests in: recently failed tests first (latest failure first), then the
+    rest from cheapest to most expensive. Tests without history count as cheap, as they are new.
+    """
+    def priority(i: int) -> tuple:
+        entry = history['tests'].get(history_key(source_name, test_names[i]), {})
+        if failed_recently(history, entry):
+            return (0, -entry['last_failure'], entry.get('duration', 0), i)
+        return (1, 0, entry.get('duration', 0), i)
+
+    return sorted(range(len(test_names)), key=priority)
+
+def schedule_sources(history: dict, source_names: list[str], test_names: list[str]) -> list[int]:
+    """
+    Returns the order to run the sources in: sources with recently failed tests first (latest failure
+    first), then the rest in the given order.
+    """
+    def priority(i: int) -> tuple:
+        entries = [history['tests'].get(history_key(source_names[i], t), {}) for t in test_names]
+        failures = [e['last_failure'] for e in entries if failed_recently(history, e)]
+        if failures:
+            return (0, -max(failures), i)
+        return (1, 0, i)
+
+    return sorted(range(len(source_names)), key=priority)
@@ -0,0 +1,328 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+Runs a solution against an interactor program, kattis style.
+
+The interactor is started as `interactor <input> <answer> <feedback dir>`, reads the solution's output on
+stdin and writes to the solution's stdin. It exits with 42 if the solution is accepted and 43 if it gave
+a wrong answer. For testing, traffic is relayed through non-blocking pipes so that a bounded transcript can
+be kept. For benchmarks, the programs are connected directly, as the relay costs more than the exchanges.
+"""
+
+import os
+import selectors
+import shlex
+import subprocess
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+INTERACTOR_NAME = 'interactor'
+
+ACCEPTED_EXIT_CODE = 42
+WRONG_ANSWER_EXIT_CODE = 43
+
+# fail if neither program writes anything for this long
+EXCHANGE_TIMEOUT_SECONDS = 10.0
+# benchmark runs are killed after this long in total
+DIRECT_RUN_TIMEOUT_SECONDS = 60.0
+# only the tail of the transcript is kept
+TRANSCRIPT_MAX_BYTES = 64 * 1024
+
+READ_SIZE = 64 * 1024
+
+class Verdict:
+    Accepted = 'ACCEPTED'
+    WrongAnswer = 'WRONG ANSWER'
+    RunError = 'RUN ERROR'
+    Timeout = 'TIMEOUT'
+    InteractorError = 'INTERACTOR ERROR'
+
+class Transcript:
+    """
+    Tail of the traffic between solution and interactor, at most max_bytes.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.chunks: deque[tuple[str, bytes]] = deque()
+        self.size = 0
+        self.dropped = 0
+
+    def add(self, direction: str, data: bytes) -> None:
+        if self.chunks and self.chunks[-1][0] == direction:
+            self.chunks[-1] = (direction, self.chunks[-1][1] + data)
+        else:
+            self.chunks.append((direction, data))
+        self.size += len(data)
+
+        while self.size > self.max_bytes:
+            first_direction, first = self.chunks[0]
+            excess = self.size - self.max_bytes
+            if len(first) <= excess:
+                self.chunks.popleft()
+                self.size -= len(first)
+                self.dropped += len(first)
+            else:
+                self.chunks[0] = (first_direction, first[excess:])
+                self.size -= excess
+                self.dropped += excess
+
+    def lines(self) -> list[str]:
+        """
+        Transcript lines prefixed with '>' for solution output and '<' for interactor output.
+        """
+        res = []
+        for direction, data in self.chunks:
+            for line in data.decode('utf-8', errors='replace').splitlines():
+                res.append(f'{direction} {line}')
+        return res
+
+class InteractiveResult:
+    def __init__(self, verdict: str, wall_time: float, cpu_time: float|None, exchanges: int, transcript: Transcript, solution_returncode: int|None, interactor_returncode: int|None):
+        self.verdict = verdict
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.exchanges = exchanges
+        self.transcript = transcript
+        self.solution_returncode = solution_returncode
+        self.interactor_returncode = interactor_returncode
+
+def find_interactor(problem_dir: Path, accepted_suffixes: list[str]) -> Path|None:
+    for suffix in accepted_suffixes:
+        interactor = problem_dir / f'{INTERACTOR_NAME}{suffix}'
+        if interactor.is_file():
+            return interactor
+    return None
+
+def wait_with_cpu_time(process: subprocess.Popen, timeout: float) -> float|None:
+    """
+    Waits like Popen.wait, and returns the cpu time used by the process where the platform can tell.
+    """
+    if not hasattr(os, 'wait4'):
+        process.wait(timeout)
+        return None
+
+    deadline = time.perf_counter() + timeout
+    delay = 0.0001
+    while True:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return rusage.ru_utime + rusage.ru_stime
+        if time.perf_counter() > deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.01)
+
+def wait_blocking_with_cpu_time(process: subprocess.Popen) -> float|None:
+    """
+    Waits without polling, so that the exit is noticed right away, and returns the cpu time used by the
+    process where the platform can tell.
+    """
+    if not hasattr(os, 'wait4'):
+        process.wait()
+        return None
+
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return rusage.ru_utime + rusage.ru_stime
+
+def interactive_verdict(timed_out: bool, solution_returncode: int|None, interactor_returncode: int|None) -> str:
+    if timed_out:
+        return Verdict.Timeout
+    elif interactor_returncode == WRONG_ANSWER_EXIT_CODE:
+        return Verdict.WrongAnswer
+    elif solution_returncode != 0:
+        return Verdict.RunError
+    elif interactor_returncode == ACCEPTED_EXIT_CODE:
+        return Verdict.Accepted
+    else:
+        return Verdict.InteractorError
+
+def write_all(fd: int, buffer: bytearray) -> bool:
+    """
+    Writes as much as possible without blocking, returns False if the reader has gone away.
+    """
+    try:
+        while buffer:
+            written = os.write(fd, buffer)
+            del buffer[:written]
+    except BlockingIOError:
+        pass
+    except (BrokenPipeError, ConnectionResetError):
+        buffer.clear()
+        return False
+    return True
+
+def run_interactive(
+        solution_command: str,
+        interactor_command: str,
+        in_file: str,
+        ans_file: str,
+        feedback_dir: Path,
+        exchange_timeout: float = EXCHANGE_TIMEOUT_SECONDS,
+        transcript_bytes: int = TRANSCRIPT_MAX_BYTES) -> InteractiveResult:
+    feedback_dir.mkdir(exist_ok=True)
+    transcript = Transcript(transcript_bytes)
+
+    start = time.perf_counter()
+    with open(feedback_dir / 'solution_stderr', 'wb') as solution_stderr, open(feedback_dir / 'interactor_stderr', 'wb') as interactor_stderr:
+        solution = subprocess.Popen(
+            shlex.split(solution_command),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=solution_stderr)
+        interactor = subprocess.Popen(
+            shlex.split(interactor_command) + [in_file, ans_file, str(feedback_dir) + os.sep],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=interactor_stderr)
+
+    # (read fd, write fd, transcript direction)
+    relays = {
+        solution.stdout.fileno(): (interactor.stdin.fileno(), '>'),
+        interactor.stdout.fileno(): (solution.stdin.fileno(), '<'),
+    }
+    pending: dict[int, bytearray] = {w: bytearray() for w, _ in relays.values()}
+    writers = {solution.stdin.fileno(): solution.stdin, interactor.stdin.fileno(): interactor.stdin}
+    # readers whose output has ended, their writer is closed once drained
+    ended: set[int] = set()
+    closed: set[int] = set()
+
+    for fd in list(relays) + list(pending):
+        os.set_blocking(fd, False)
+
+    selector = selectors.DefaultSelector()
+    for fd in relays:
+        selector.register(fd, selectors.EVENT_READ)
+
+    timed_out = False
+    switches = 0
+    last_direction = ''
+
+    def close_writer(w: int) -> None:
+        if w not in closed:
+            closed.add(w)
+            if w in selector.get_map():
+                selector.unregister(w)
+            writers[w].close()
+
+    while len(ended) < len(relays) or any(pending[w] for w in pending if w not in closed):
+        events = selector.select(exchange_timeout)
+        if not events:
+            timed_out = True
+            break
+
+        for key, mask in events:
+            fd = key.fd
+            if mask & selectors.EVENT_READ:
+                try:
+                    data = os.read(fd, READ_SIZE)
+                except BlockingIOError:
+                    continue
+
+                w, direction = relays[fd]
+                if not data:
+                    selector.unregister(fd)
+                    ended.add(fd)
+                    if not pending[w]:
+                        close_writer(w)
+                    continue
+
+                transcript.add(direction, data)
+                if direction != last_direction:
+                    switches += 1
+                    last_direction = direction
+
+                if w in closed:
+                    continue
+                pending[w] += data
+                if not write_all(w, pending[w]):
+                    close_writer(w)
+                elif pending[w] and w not in selector.get_map():
+                    selector.register(w, selectors.EVENT_WRITE)
+            elif mask & selectors.EVENT_WRITE:
+                if not write_all(fd, pending[fd]):
+                    close_writer(fd)
+                elif not pending[fd]:
+                    selector.unregister(fd)
+                    # the reader feeding this writer has ended, nothing more will come
+                    if any(r in ended for r, (rw, _) in relays.items() if rw == fd):
+                        close_writer(fd)
+
+    for w in pending:
+        close_writer(w)
+    selector.close()
+
+    if timed_out:
+        solution.kill()
+        interactor.kill()
+
+    solution_cpu = None
+    try:
+        solution_cpu = wait_with_cpu_time(solution, exchange_timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        solution.kill()
+        solution.wait()
+
+    try:
+        interactor.wait(exchange_timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        interactor.kill()
+        interactor.wait()
+
+    solution_returncode = solution.returncode
+    interactor_returncode = interactor.returncode
+    solution.stdout.close()
+    interactor.stdout.close()
+    wall_time = time.perf_counter() - start
+
+    verdict = interactive_verdict(timed_out, solution_returncode, interactor_returncode)
+    return InteractiveResult(verdict, wall_time, solution_cpu, (switches + 1) // 2, transcript, solution_returncode, interactor_returncode)
+
+def run_interactive_direct(
+        solution_command: str,
+        interactor_command: str,
+        in_file: str,
+        ans_file: str,
+        feedback_dir: Path,
+        timeout: float = DIRECT_RUN_TIMEOUT_SECONDS) -> InteractiveResult:
+    """
+    Like run_interactive, but with the solution and interactor connected by plain pipes. No transcript is
+    kept and exchanges are not counted.
+    """
+    feedback_dir.mkdir(exist_ok=True)
+    to_solution_read, to_solution_write = os.pipe()
+    to_interactor_read, to_interactor_write = os.pipe()
+
+    start = time.perf_counter()
+    try:
+        with open(feedback_dir / 'solution_stderr', 'wb') as solution_stderr, open(feedback_dir / 'interactor_stderr', 'wb') as interactor_stderr:
+            solution = subprocess.Popen(
+                shlex.split(solution_command),
+                stdin=to_solution_read, stdout=to_interactor_write, stderr=solution_stderr)
+            interactor = subprocess.Popen(
+                shlex.split(interactor_command) + [in_file, ans_file, str(feedback_dir) + os.sep],
+                stdin=to_interactor_read, stdout=to_solution_write, stderr=interactor_stderr)
+    finally:
+        # only the children may hold the pipes, so that each sees end of file when the other exits
+        for fd in (to_solution_read, to_solution_write, to_interactor_read, to_interactor_write):
+            os.close(fd)
+
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        timed_out.set()
+        solution.kill()
+        interactor.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    solution_cpu = wait_blocking_with_cpu_time(solution)
+    interactor.wait()
+    wall_time = time.perf_counter() - start
+    timer.cancel()
+
+    verdict = interactive_verdict(timed_out.is_set(), solution.returncode, interactor.returncode)
+    return InteractiveResult(verdict, wall_time, solution_cpu, 0, Transcript(0), solution.returncode, interactor.returncode)
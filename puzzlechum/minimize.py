@@ -0,0 +1,313 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+Shrinks a failing test input with delta debugging, first over lines and then over tokens.
+
+A candidate input is kept if the solution still fails on it the same way as on the original input: the
+same crash (exit code and error, see error_signature), a timeout, or with a reference solution a different output. The
+reference must accept the candidate, so that inputs it cannot handle are not kept.
+"""
+
+import hashlib
+import itertools
+import os
+import re
+import shutil
+import signal
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from .interactive import find_interactor
+from .runtest import (
+    ACCEPTED_SRC_SUFFIXES, DIMMED, GREEN, NULL, TMP_PATH,
+    check_create_tmp_dir, compile_and_get_test_command, get_ins_and_ans, get_source_files,
+    problem_test_dirs, relativeCwd, resolve_problem_name,
+)
+from .testdata import open_test_text, split_archive_path, test_stem
+
+# candidates running longer than this are considered passing
+MINIMIZE_TIMEOUT_SECONDS = 10
+
+MINIMIZE_DIR = TMP_PATH / 'minimize'
+
+# 'File "a.py", line 5, in <module>' of a python traceback
+TRACEBACK_FRAME = re.compile(r'(File ".*", line \d+)')
+
+class Candidate:
+    """
+    Runs a solution and optionally a reference solution on candidate inputs, caching outcomes by content.
+    A candidate fails if the solution fails on it the same way as on the original input (see expected).
+    """
+    def __init__(self, solution_command: str, reference_command: str):
+        self.solution_command = solution_command
+        self.reference_command = reference_command
+        self.counter = itertools.count()
+        self.cache: dict[str, tuple|None] = {}
+        self.lock = threading.Lock()
+        # outcome of the original input
+        self.expected: tuple|None = None
+
+    def run(self, command: str, input_path: Path, output_path: Path) -> tuple[int|None, str, list[str]]:
+        """
+        Returns the return code (None on timeout), the error signature of stderr and the output tokens.
+        """
+        stderr_path = Path(f'{output_path}_stderr')
+        execution_cmd = command.format(relativeCwd(input_path), relativeCwd(output_path))
+        with open(stderr_path, 'wb') as stderr:
+            # own session, so that the solution and not only the shell is killed on timeout
+            process = subprocess.Popen([f'({execution_cmd})'], shell=True, stdout=subprocess.DEVNULL, stderr=stderr, start_new_session=True)
+            try:
+                returncode = process.wait(MINIMIZE_TIMEOUT_SECONDS)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                stderr_path.unlink()
+                return None, '', []
+
+        with open(stderr_path, 'r', errors='replace') as f:
+            error = error_signature(f.read())
+        stderr_path.unlink()
+        with open(output_path, 'r', errors='replace') as f:
+            tokens = f.read().split()
+        return returncode, error, tokens
+
+    def outcome(self, content: str) -> tuple|None:
+        """
+        How the solution fails on the content: ('timeout',), ('crash', return code, error) or ('wrong answer',).
+        None if it does not fail, or if the reference cannot handle the content either.
+        """
+        key = hashlib.sha1(content.encode()).hexdigest()
+        with self.lock:
+            if key in self.cache:
+                return self.cache[key]
+
+        index = next(self.counter)
+        input_path = MINIMIZE_DIR / f'candidate_{index}.in'
+        with open(input_path, 'w') as f:
+            f.write(content)
+
+        res = None
+        returncode, error, output = self.run(self.solution_command, input_path, MINIMIZE_DIR / f'candidate_{index}.out')
+        ref_returncode, ref_output = 0, output
+        if self.reference_command:
+            ref_returncode, _, ref_output = self.run(self.reference_command, input_path, MINIMIZE_DIR / f'candidate_{index}.ref')
+
+        # an input the reference cannot handle is not a valid input
+        if ref_returncode == 0:
+            if returncode is None:
+                res = ('timeout',)
+            elif returncode != 0:
+                res = ('crash', returncode, error)
+            elif output != ref_output:
+                res = ('wrong answer',)
+
+        for suffix in ('in', 'out', 'ref'):
+            (MINIMIZE_DIR / f'candidate_{index}.{suffix}').unlink(missing_ok=True)
+
+        with self.lock:
+            self.cache[key] = res
+        return res
+
+    def fails(self, content: str) -> bool:
+        return self.expected is not None and self.outcome(content) == self.expected
+
+def error_signature(stderr: str) -> str:
+    """
+    Identifies the error in stderr. For a python traceback it is the exception and where it was raised, like
+    'ValueError at File "a.py", line 5', so that messages with input values in them still match. Otherwise the
+    last line of stderr, like a failed c++ assertion with its location.
+    """
+    lines = [line.strip() for line in stderr.splitlines() if line.strip()]
+    # rust prints a hint after the panic message
+    if lines and lines[-1].startswith('note: '):
+        lines.pop()
+    if not lines:
+        return ''
+
+    frames = [line for line in lines if TRACEBACK_FRAME.match(line)]
+    exception = re.match(r'([A-Za-z_][\w.]*)(:|$)', lines[-1])
+    if frames and exception:
+        return f'{exception[1]} at {TRACEBACK_FRAME.match(frames[-1])[1]}'
+    return lines[-1]
+
+def outcome_to_string(outcome: tuple) -> str:
+    if outcome[0] == 'crash':
+        error = f', {outcome[2]}' if outcome[2] else ''
+        return f'crash (exit code {outcome[1]}{error})'
+    elif outcome[0] == 'timeout':
+        return f'timeout ({MINIMIZE_TIMEOUT_SECONDS} s)'
+    return outcome[0]
+
+def split(units: list, n: int) -> list[list]:
+    size, rest = divmod(len(units), n)
+    chunks = []
+    start = 0
+    for i in range(n):
+        end = start + size + (i < rest)
+        chunks.append(units[start:end])
+        start = end
+    return [c for c in chunks if c]
+
+def ddmin(units: list, fails: Callable[[list], bool], executor: ThreadPoolExecutor, on_progress: Callable[[list], None]) -> list:
+    """
+    Delta debugging (Zeller), testing every subset and complement of a round in parallel.
+    """
+    n = 2
+    while len(units) >= 2:
+        chunks = split(units, n)
+        complements = [] if len(chunks) == 2 else [
+            [u for j, c in enumerate(chunks) if j != i for u in c] for i in range(len(chunks))]
+        candidates = chunks + complements
+
+        reduced = None
+        for i, res in enumerate(executor.map(fails, candidates)):
+            if res:
+                reduced = i
+                break
+
+        if reduced is not None and reduced < len(chunks):
+            units = chunks[reduced]
+            n = 2
+            on_progress(units)
+        elif reduced is not None:
+            units = candidates[reduced]
+            n = max(n - 1, 2)
+            on_progress(units)
+        elif n >= len(units):
+            break
+        else:
+            n = min(len(units), n * 2)
+
+    return units
+
+def lines_to_content(lines: list[str]) -> str:
+    return ''.join(lines)
+
+def tokens_to_content(tokens: list[tuple[int, str]]) -> str:
+    """
+    Tokens are (line index, token), tokens of the same line are joined with spaces.
+    """
+    lines = []
+    for _, line_tokens in itertools.groupby(tokens, key=lambda t: t[0]):
+        lines.append(' '.join(t for _, t in line_tokens) + '\n')
+    return ''.join(lines)
+
+def find_test(ins_ans_pairs: list[tuple[str, str]], test: str) -> tuple[str, str]|None:
+    for in_file, ans_file in ins_ans_pairs:
+        if test_stem(in_file) == test or Path(in_file).resolve() == Path(test).resolve():
+            return in_file, ans_file
+    return None
+
+def find_source(problem_dir: Path, source_files: list[Path], name: str) -> Path|None:
+    for s in source_files:
+        if s.name == name or s.stem == name:
+            return s
+    for path in [problem_dir / name, Path(name)] + [problem_dir / f'{name}{suffix}' for suffix in ACCEPTED_SRC_SUFFIXES]:
+        if path.is_file() and path.suffix in ACCEPTED_SRC_SUFFIXES:
+            # paths given relative to the current directory would make relativeCwd fail
+            return path.resolve()
+    return None
+
+def minimize(problems_root: Path, problem_name: str, test: str, solution: str|None, reference: str|None, jobs: int|None) -> None:
+    problem_name = resolve_problem_name(problems_root, problem_name)
+    problem_dir = problems_root / problem_name
+
+    if find_interactor(problem_dir, ACCEPTED_SRC_SUFFIXES):
+        print('Minimizing tests of interactive problems is not supported')
+        exit(1)
+
+    ins_ans_pairs = get_ins_and_ans(problem_test_dirs(problems_root, problem_name))
+    found = find_test(ins_ans_pairs, test)
+    if found is None:
+        print(f"No such test for {problem_name}: '{test}'")
+        exit(1)
+    in_file, _ = found
+
+    source_files = get_source_files(problems_root, problem_name)
+    reference_file = None
+    if reference:
+        reference_file = find_source(problem_dir, source_files, reference)
+        if reference_file is None:
+            print(f"No such reference solution: '{reference}'")
+            exit(1)
+
+    if solution:
+        solution_file = find_source(problem_dir, source_files, solution)
+    else:
+        candidates = [s for s in source_files if s != reference_file]
+        solution_file = candidates[0] if len(candidates) == 1 else None
+        if len(candidates) > 1:
+            print(f"Several solutions found, choose one with --solution: [{', '.join(s.name for s in candidates)}]")
+            exit(1)
+    if solution_file is None:
+        print(f'No solution to minimize for {problem_name}')
+        exit(1)
+
+    check_create_tmp_dir()
+    MINIMIZE_DIR.mkdir(exist_ok=True)
+
+    solution_command = compile_and_get_test_command(problems_root, solution_file, problem_dir, f'{solution_file.stem}_{solution_file.suffix[1:]}_minimize')
+    reference_command = ''
+    if reference_file:
+        reference_command = compile_and_get_test_command(problems_root, reference_file, problem_dir, f'{reference_file.stem}_{reference_file.suffix[1:]}_reference')
+        if not reference_command:
+            exit(1)
+    if not solution_command:
+        exit(1)
+
+    with open_test_text(in_file) as f:
+        lines = f.read().splitlines(keepends=True)
+    # make sure the last line ends like the rest, so that lines can be reordered freely
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += '\n'
+
+    candidate = Candidate(solution_command, reference_command)
+    candidate.expected = candidate.outcome(lines_to_content(lines))
+    if candidate.expected is None:
+        if reference_file:
+            print(f"{relativeCwd(solution_file)} gives the same output as {relativeCwd(reference_file)} on '{relativeCwd(in_file)}', nothing to minimize")
+        else:
+            print(f"{relativeCwd(solution_file)} does not crash or time out on '{relativeCwd(in_file)}', use --reference to minimize wrong answers")
+        exit(1)
+
+    jobs = jobs or os.cpu_count() or 1
+    print(f"{DIMMED}Minimizing '{relativeCwd(in_file)}' for {relativeCwd(solution_file)} using {jobs} jobs, keeping the failure: {outcome_to_string(candidate.expected)}{NULL}")
+
+    def progress(units: list) -> None:
+        print(f'  {len(units)} {unit_name} left')
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        unit_name = 'lines'
+        print(f'{len(lines)} lines')
+        lines = ddmin(lines, lambda c: candidate.fails(lines_to_content(c)), executor, progress)
+
+        tokens = [(i, t) for i, line in enumerate(lines) for t in line.split()]
+        unit_name = 'tokens'
+        print(f'{len(tokens)} tokens')
+        tokens = ddmin(tokens, lambda c: candidate.fails(tokens_to_content(c)), executor, progress)
+
+    content = tokens_to_content(tokens)
+    if not candidate.fails(content):
+        content = lines_to_content(lines)
+
+    # tests in archives are minimized next to the archive
+    archived = split_archive_path(in_file)
+    test_dir = archived[0].parent if archived else Path(in_file).parent
+    min_in_path = test_dir / f'{test_stem(in_file)}.min.in'
+    with open(min_in_path, 'w') as f:
+        f.write(content)
+    print()
+    print(f"{GREEN}Minimized input written to '{relativeCwd(min_in_path)}'{NULL} ({len(content)} bytes)")
+
+    if reference_command:
+        min_ans_path = test_dir / f'{test_stem(in_file)}.min.ans'
+        subprocess.run([f'({reference_command.format(relativeCwd(min_in_path), relativeCwd(min_ans_path))})'], shell=True, capture_output=True)
+        print(f"{GREEN}Reference answer written to '{relativeCwd(min_ans_path)}'{NULL}")
+    print(f'{relativeCwd(solution_file)} still fails on it: {outcome_to_string(candidate.expected)}')
+
+    shutil.rmtree(MINIMIZE_DIR)
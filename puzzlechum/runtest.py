@@ -11,9 +11,26 @@ from io import TextIOWrapper
 import subprocess
 import json
 import os
+import shutil
+import threading
+import time
 
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:
+    # not available on windows, cpu times are left out there
+    resource = None
+
+from .newproblem import get_config
+from .buildcache import precompiled_header, rust_incremental_dir
+from .forkserver import ForkServer, has_fork
+from .trace import TRACER, trace_path
+from .history import load_history, record_result, save_history, schedule_sources, schedule_tests
+from .interactive import INTERACTOR_NAME, InteractiveResult, Verdict, find_interactor, run_interactive, run_interactive_direct
+from .testdata import find_tests, is_plain_file, open_test_file, open_test_text, plain_test_file, test_stem
+
 RED = '\x1b[38;5;3m'
 BLUE = '\x1b[38;5;2m'
 GREEN = '\x1b[38;5;1m'
@@ -38,30 +55,41 @@ CPP_COMPILE_FLAGS = 'g++ -g -O2 -std=gnu++17 -static -lrt -Wl,--whole-archive -l
 RUST_COMPILE_FLAGS = 'rustc --crate-type bin --edition=2018'
 PYTHON_COMPILE_FLAGS = 'pypy3'
 
+# read by the solution when the test input is streamed to its stdin
+STREAMED_INPUT = '/dev/stdin'
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# tests using at least this share of the time limit are highlighted
+TIME_LIMIT_WARNING_RATIO = 0.8
+TIME_LIMIT_KEY = 'time_limit'
+
+# number of timed runs of interactive benchmarks, which are timed by chum instead of hyperfine
+INTERACTIVE_BENCHMARK_RUNS = 10
+
 class BenchmarkTask:
-    def __init__(self, source_name: str, test_input: str, execution_command: str):
+    def __init__(self, source_name: str, test_input: str, execution_command: str, interactor_command: str = '', test_answer: str = ''):
         self.task_name = source_name
         self.test_input = test_input
         self.task = execution_command
+        self.interactor_command = interactor_command
+        self.test_answer = test_answer
 
-def get_ins_and_ans(test_dirs) -> list[tuple[str, str]]:
-    ans = []
-    ins = []
-
-    for d in test_dirs:
-        if d.is_dir():
-            ans += d.glob('*.ans')
-            ans += d.glob('*.out')
-            ins += d.glob('*.in')
+class TestTiming:
+    def __init__(self, wall_time: float, cpu_time: float|None):
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
 
-    # remove test files that don't have both .in and .ans
-    ans = [a for a in ans if str(a.parent / a.stem) in [str(i.parent / i.stem) for i in ins]]
-    ins = [i for i in ins if str(i.parent / i.stem) in [str(a.parent / a.stem) for a in ans]]
+    def limited_time(self) -> float:
+        """
+        The time compared with the time limit, kattis limits cpu time.
+        """
+        return self.cpu_time if self.cpu_time is not None else self.wall_time
 
-    ans = sorted(ans)
-    ins = sorted(ins)
+def get_ins_and_ans(test_dirs) -> list[tuple[str, str]]:
+    return find_tests(test_dirs)
 
-    return list(zip([str(x) for x in ins], [str(x) for x in ans]))
+def command_without_redirection(test_command: str) -> str:
+    return test_command[:test_command.find(' < ')]
 
 def check_create_tmp_dir() -> None:
     if not TMP_PATH.is_dir():
@@ -92,17 +120,33 @@ def relativeCwd(path: str | Path) -> str:
     else:
         return str(Path(path).relative_to(Path.cwd()))
 
-def compile_and_get_test_command(source_file, problem_dir) -> str:
+def compile_and_get_test_command(problems_root: Path, source_file, problem_dir, output_name: str|None = None) -> str:
     # TODO extend to handle more languages
-    output_name = f'{source_file.stem}_{source_file.suffix[1:]}'
+    if output_name is None:
+        output_name = f'{source_file.stem}_{source_file.suffix[1:]}'
     output_executable = TMP_PATH / output_name
 
+    compile_start = time.perf_counter()
+    cache_note = ''
+
     if source_file.suffix == '.cpp':
         # see https://open.kattis.com/languages/cpp
         CC = CPP_COMPILE_FLAGS + f' -o {output_executable} -I {problem_dir}'
+
+        pch_start = time.perf_counter()
+        with TRACER.span(f'precompiled header {source_file.name}', 'compile'):
+            header, built = precompiled_header(problems_root, source_file, problem_dir, CPP_COMPILE_FLAGS)
+        if header:
+            CC += f' -include {header}'
+            if built:
+                cache_note = f'precompiled header built in {time_to_string(time.perf_counter() - pch_start)}'
+            else:
+                cache_note = 'precompiled header reused'
     elif source_file.suffix == '.rs':
         # see https://open.kattis.com/languages/rust
-        CC = RUST_COMPILE_FLAGS + f' -o {output_executable}'
+        incremental_dir = rust_incremental_dir(problems_root, source_file)
+        cache_note = 'incremental' if any(incremental_dir.iterdir()) else 'incremental, first build'
+        CC = RUST_COMPILE_FLAGS + f' -o {output_executable} -C incremental={incremental_dir}'
     elif source_file.suffix == '.py':
         # see https://open.kattis.com/languages/python3
         try:
@@ -116,7 +160,8 @@ def compile_and_get_test_command(source_file, problem_dir) -> str:
 
     output = None
     if source_file.suffix not in ('.py'):
-        output = subprocess.run(f'{CC} {source_file}', shell=True, capture_output=True)
+        with TRACER.span(f'compile {source_file.name}', 'compile', source=str(source_file)):
+            output = subprocess.run(f'{CC} {source_file}', shell=True, capture_output=True)
 
     if output and output.returncode != 0: # execution error
         print()
@@ -129,6 +174,10 @@ def compile_and_get_test_command(source_file, problem_dir) -> str:
             print(f'{YELLOW}{source_file} has compile warnings:{NULL}')
             print(output.stderr.decode("utf-8"))
 
+        if output:
+            compile_time = time_to_string(time.perf_counter() - compile_start)
+            print(f'{DIMMED}Compiled {relativeCwd(source_file)} in {compile_time}{f" ({cache_note})" if cache_note else ""}{NULL}')
+
         shell = os.environ.get('SHELL', '')
 
         if source_file.suffix == '.py':
@@ -191,7 +240,7 @@ def check_test(output_path, ans_path) -> bool:
 
     Print expected output.
     """
-    with open(output_path, 'r') as o_file, open(Path(ans_path), 'r') as a_file:
+    with open(output_path, 'r') as o_file, open_test_text(ans_path) as a_file:
         for line, a_line in enumerate(a_file):
             # only check when input has a non-whitespace
             if not a_line.isspace():
@@ -218,35 +267,69 @@ def check_test(output_path, ans_path) -> bool:
 
     return success
 
-def benchmark_report(benchmark: BenchmarkTask) -> list[str]:
+def benchmark_report(benchmark: BenchmarkTask, *others: BenchmarkTask) -> list[str]:
     """
-    Runs the benchmark task and returns the report.
+    Runs the benchmark task and returns the report. Other tasks on the same test are run in the same
+    hyperfine call, and get one report row each.
     """
-    test_name = Path(benchmark.test_input).stem
+    test_name = test_stem(benchmark.test_input)
     md_path = TMP_PATH / f'{benchmark.task_name}_{test_name}.md'
 
-    execution_without_input_output = benchmark.task[:benchmark.task.find(' < ')]
+    # hyperfine reads the input once per run, so it needs the data on disk
+    test_input = plain_test_file(benchmark.test_input, TMP_PATH)
+
+    commands = ''
+    for b in (benchmark, *others):
+        commands += f" --command-name '{b.task_name} --> {test_name}' '{command_without_redirection(b.task)}'"
 
-    subprocess.run(f"{HYPERFINE} --shell=none --export-markdown={str(md_path)} --command-name '{benchmark.task_name} --> {test_name}' --input '{benchmark.test_input}' '{execution_without_input_output}'", shell=True)
+    subprocess.run(f"{HYPERFINE} --shell=none --export-markdown={str(md_path)} --input '{test_input}'{commands}", shell=True)
 
     with open(md_path, 'r') as f:
         return f.readlines()
 
+def report_speed(lines: list[str], measurement: 'Benchmark', task_name: str|None = None) -> str:
+    """
+    Reads the average or fastest time from a hyperfine markdown report, from the row of the given task
+    or from the first row.
+    """
+    column = 2 if measurement == Benchmark.Average else 3
+    unit = lines[0].split('|')[column].split()[1][1:-1].strip()
+    rows = lines[2:]
+    if task_name is not None:
+        rows = [r for r in rows if r.split('|')[1].strip().startswith(f'`{task_name} --> ')]
+    stats = rows[0]
+    speed = stats.split('|')[column].split()[0].strip()
+
+    return f'{speed} {unit}'
+
+def interactive_benchmark_times(benchmark: BenchmarkTask) -> list[float]:
+    feedback_dir = TMP_PATH / f'{benchmark.task_name}_{test_stem(benchmark.test_input)}_benchmark_feedback'
+    command = command_without_redirection(benchmark.task)
+    test_input = plain_test_file(benchmark.test_input, TMP_PATH)
+    test_answer = plain_test_file(benchmark.test_answer, TMP_PATH)
+
+    # warmup
+    run_interactive_direct(command, benchmark.interactor_command, test_input, test_answer, feedback_dir)
+
+    times = []
+    for _ in range(INTERACTIVE_BENCHMARK_RUNS):
+        result = run_interactive_direct(command, benchmark.interactor_command, test_input, test_answer, feedback_dir)
+        times.append(result.wall_time)
+
+    return times
+
 def benchmark_average(benchmark: BenchmarkTask) -> str:
-    lines = benchmark_report(benchmark)
-    mean_unit = lines[0].split('|')[2].split()[1][1:-1].strip()
-    stats = lines[2]
-    average = stats.split('|')[2].split()[0].strip()
+    if benchmark.interactor_command:
+        times = interactive_benchmark_times(benchmark)
+        return time_to_string(sum(times) / len(times))
 
-    return f'{average} {mean_unit}'
+    return report_speed(benchmark_report(benchmark), Benchmark.Average)
 
 def benchmark_fastest(benchmark: BenchmarkTask) -> str:
-    lines = benchmark_report(benchmark)
-    min_unit = lines[0].split('|')[3].split()[1][1:-1].strip()
-    stats = lines[2]
-    fastest = stats.split('|')[3].strip()
+    if benchmark.interactor_command:
+        return time_to_string(min(interactive_benchmark_times(benchmark)))
 
-    return f'{fastest} {min_unit}'
+    return report_speed(benchmark_report(benchmark), Benchmark.Fastest)
 
 def benchmark_path(problems_root: Path, benchmark_name: str) -> Path:
     return problems_root / '.chum' / 'benchmarks' / f'{benchmark_name}.json'
@@ -255,7 +338,10 @@ def has_old_benchmark(problems_root: Path, benchmark_name: str) -> bool:
     return benchmark_path(problems_root, benchmark_name).is_file()
 
 def load_old_benchmark(problems_root: Path, benchmark_name: str) -> dict[tuple[str, str], str]:
-    with open(benchmark_path(problems_root, benchmark_name), 'r') as json_file:
+    return load_benchmark_file(benchmark_path(problems_root, benchmark_name))
+
+def load_benchmark_file(path: Path) -> dict[tuple[str, str], str]:
+    with open(path, 'r') as json_file:
         serialized_data = json.load(json_file)
 
     res = {}
@@ -315,13 +401,12 @@ def time_to_string(number: float) -> str:
 
     return f"{formatted_value} {suffix}"
 
-def benchmark_diff(old_speed: str, new_speed: str) -> str:
-    old_unit = old_speed.split()[1]
-    o_speed = float(old_speed.split()[0])
-    new_unit = new_speed.split()[1]
-    n_speed = float(new_speed.split()[0])
+def speed_to_seconds(speed: str) -> float:
+    number, unit = speed.split()
+    return convert_time_unit(float(number), unit)
 
-    diff = convert_time_unit(n_speed, new_unit) - convert_time_unit(o_speed, old_unit)
+def benchmark_diff(old_speed: str, new_speed: str) -> str:
+    diff = speed_to_seconds(new_speed) - speed_to_seconds(old_speed)
 
     if (diff < 0):
         return f'({GREEN}{time_to_string(diff)}{NULL})'
@@ -346,17 +431,18 @@ class Benchmark(Enum):
 def run_and_print_benchmarks(problems_root: Path, benchmarks: list[BenchmarkTask], problem_name: str, measurement: Benchmark) -> None:
     benchmarks = sorted(benchmarks, key= lambda b: b.task_name + b.test_input)
     names = sorted(set([x.task_name for x in benchmarks]))
-    tests = sorted(set([Path(x.test_input).stem for x in benchmarks]))
+    tests = sorted(set([test_stem(x.test_input) for x in benchmarks]))
 
     speeds: dict[tuple[str, str], str] = {}
     for i, benchmark in enumerate(benchmarks):
         measure: str = ''
-        if (measurement == Benchmark.Average):
-            measure = benchmark_average(benchmark)
-        elif (measurement == Benchmark.Fastest):
-            measure = benchmark_fastest(benchmark)
+        with TRACER.span(f'benchmark {benchmark.task_name} {test_stem(benchmark.test_input)}', 'benchmark', source=benchmark.task_name, test=benchmark.test_input):
+            if (measurement == Benchmark.Average):
+                measure = benchmark_average(benchmark)
+            elif (measurement == Benchmark.Fastest):
+                measure = benchmark_fastest(benchmark)
 
-        speeds[(benchmark.task_name, Path(benchmark.test_input).stem)] = measure
+        speeds[(benchmark.task_name, test_stem(benchmark.test_input))] = measure
 
     # load old benchmark
     old_benchmark: dict[tuple[str, str], str] = {}
@@ -403,41 +489,260 @@ def has_hyperfine() -> bool:
     from shutil import which
     return which('hyperfine') is not None
 
-def run_and_test(problems_root: Path, problem_name: str, benchmark: bool, benchmark_average: bool, cleanup: bool = False) -> None:
-    if not valid_problem_name(problems_root, problem_name):
-        problem_suggestions = match_problems_folder(problems_root, problem_name)
+def print_interactive_failure(src: Path, in_file: str, result: InteractiveResult, feedback_dir: Path) -> None:
+    print(f"{YELLOW}{relativeCwd(src)} on '{relativeCwd(in_file)}'{NULL}")
+    print(f'{RED}{result.verdict}!{NULL} (solution exit code: {result.solution_returncode}, interactor exit code: {result.interactor_returncode})')
+
+    for name in ('judgemessage.txt', 'interactor_stderr', 'solution_stderr'):
+        path = feedback_dir / name
+        if path.is_file() and path.stat().st_size:
+            with open(path, 'r', errors='replace') as f:
+                content = f.read().split('\n')
+            print(f'{name}:')
+            print('\n'.join(content[-10:]))
+
+    # '>' is solution output, '<' is interactor output
+    lines = result.transcript.lines()
+    print(f'TRANSCRIPT: [last {min(len(lines), 20)} lines, {DIMMED}>{NULL} solution, {DIMMED}<{NULL} interactor]')
+    if result.transcript.dropped or len(lines) > 20:
+        print('...')
+    print('\n'.join(lines[-20:]))
+    print()
 
-        # auto-select problem
-        if len(problem_suggestions) == 1:
-            problem_name = problem_suggestions[0].name
-            print(f'No such problem exists, using only match: {problem_name}\n')
-        # print error with suggestions
-        else:
-            print(f'No such problem exists: {(problems_root / problem_name).name}')
-            if len(problem_suggestions):
-                problems_string = '\n\t'.join(str(p.name) for p in problem_suggestions)
-                print(f'\nDid you mean any of:\n\t{problems_string}')
+def run_interactive_test(src: Path, test_command: str, interactor_command: str, in_file: str, ans_file: str) -> tuple[bool, str, TestTiming]:
+    """
+    Runs the solution against the interactor, returns whether it was accepted, a note on the run and its timing.
+    Exits on run errors, like for ordinary tests.
+    """
+    feedback_dir = TMP_PATH / f'{src.stem}_{src.suffix[1:]}_{test_stem(in_file)}_feedback'
+    with TRACER.span(f'run {src.name} {test_stem(in_file)}', 'run', source=src.name, test=in_file, interactive=True):
+        # the interactor is given paths to the test data
+        interactor_in = relativeCwd(plain_test_file(in_file, TMP_PATH))
+        interactor_ans = relativeCwd(plain_test_file(ans_file, TMP_PATH))
+        result = run_interactive(command_without_redirection(test_command), interactor_command, interactor_in, interactor_ans, feedback_dir)
+
+    if result.verdict not in (Verdict.Accepted, Verdict.WrongAnswer):
+        print()
+        print(f"{RED}{relativeCwd(src)} ERROR WHILE RUNNING TEST '{relativeCwd(in_file)}'!{NULL}")
+        print_interactive_failure(src, in_file, result, feedback_dir)
+        exit(1)
+    elif result.verdict == Verdict.WrongAnswer:
+        print_interactive_failure(src, in_file, result, feedback_dir)
 
-            exit(1)
+    return result.verdict == Verdict.Accepted, f'({result.exchanges} exchanges)', TestTiming(result.wall_time, result.cpu_time)
+
+def run_single_test(src: Path, test_command: str, interactor_command: str, server: ForkServer|None, in_file: str, ans_file: str) -> tuple[bool, str, TestTiming, str]:
+    """
+    Runs and checks one test, returns whether it passed, a note on the run, its timing and the execution command.
+    Exits on execution errors.
+    """
+    if interactor_command:
+        success, note, timing = run_interactive_test(src, test_command, interactor_command, in_file, ans_file)
+        return success, note, timing, test_command
+
+    test_output_path = TMP_PATH / f'{src.stem}_{src.suffix[1:]}_{test_stem(in_file)}_output'
+    plain_input = is_plain_file(in_file)
+    if plain_input:
+        execution_cmd = test_command.format(relativeCwd(in_file), relativeCwd(test_output_path))
+    else:
+        execution_cmd = test_command.format(STREAMED_INPUT, relativeCwd(test_output_path))
+
+    start = time.perf_counter()
+    if server and plain_input:
+        # the server forks the solution itself, so there is no separate spawn phase
+        with TRACER.span(f'run {src.name} {test_stem(in_file)}', 'run', source=src.name, test=in_file):
+            output, cpu_time = server.run(src, in_file, str(test_output_path))
+    else:
+        cpu_start = children_cpu_time()
+        # spawning is chum's overhead, apart from the time of the solution itself
+        with TRACER.span(f'spawn {src.name} {test_stem(in_file)}', 'spawn', source=src.name, test=in_file):
+            stdin = None if plain_input else subprocess.PIPE
+            process = subprocess.Popen([f'({execution_cmd})'], shell=True, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with TRACER.span(f'run {src.name} {test_stem(in_file)}', 'run', source=src.name, test=in_file):
+            if plain_input:
+                stdout, stderr = process.communicate()
+                output = subprocess.CompletedProcess(execution_cmd, process.returncode, stdout, stderr)
+            else:
+                output = stream_test_input(process, execution_cmd, in_file)
+        cpu_end = children_cpu_time()
+        cpu_time = cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None
+    timing = TestTiming(time.perf_counter() - start, cpu_time)
+
+    if output.returncode != 0: # execution error
+        print()
+        print(f"{RED}{relativeCwd(src)} ERROR WHILE RUNNING TEST '{relativeCwd(in_file)}'!{NULL}")
+        print(output.stderr.decode("utf-8"))
+        print(output.stdout.decode("utf-8"))
+        print('while running:')
+        print(f'{DIMMED}{execution_cmd}{NULL}')
+        exit(1)
+
+    with TRACER.span(f'check {src.name} {test_stem(in_file)}', 'check', source=src.name, test=in_file):
+        success = check_test(test_output_path, ans_file)
+
+    return success, '', timing, execution_cmd
+
+def stream_test_input(process: subprocess.Popen, execution_cmd: str, in_file: str) -> subprocess.CompletedProcess:
+    """
+    Decompresses the (compressed or archived) test input straight into the stdin of the started process,
+    and waits for it like subprocess.run.
+    """
+
+    def feed() -> None:
+        try:
+            with open_test_file(in_file) as stream:
+                shutil.copyfileobj(stream, process.stdin, STREAM_CHUNK_SIZE)
+        except BrokenPipeError:
+            # the solution stopped reading, which is up to the solution
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    # not communicate, which would close stdin under the feeder; stdout is redirected to the output file
+    stderr = process.stderr.read()
+    stdout = process.stdout.read()
+    process.wait()
+    feeder.join()
+
+    return subprocess.CompletedProcess(execution_cmd, process.returncode, stdout, stderr)
+
+def children_cpu_time() -> float|None:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def configured_time_limit(problems_root: Path) -> float|None:
+    config = get_config(problems_root)
+    if TIME_LIMIT_KEY in config:
+        return float(config[TIME_LIMIT_KEY])
+    return None
+
+def timing_to_string(timing: TestTiming, time_limit: float|None) -> str:
+    text = f'{time_to_string(timing.wall_time)} wall'
+    if timing.cpu_time is not None:
+        text += f', {time_to_string(timing.cpu_time)} cpu'
+
+    if time_limit:
+        if timing.limited_time() > time_limit:
+            return f'{RED}[{text}, over time limit]{NULL}'
+        elif timing.limited_time() >= time_limit * TIME_LIMIT_WARNING_RATIO:
+            return f'{YELLOW}[{text}, close to time limit]{NULL}'
+
+    return f'{DIMMED}[{text}]{NULL}'
+
+def print_slowest_tests(timings: list[tuple[Path, str, TestTiming]], count: int, time_limit: float|None) -> None:
+    slowest = sorted(timings, key=lambda t: t[2].limited_time(), reverse=True)[:count]
+
+    print()
+    print(f'{BOLD}Slowest tests{NULL}' + (f' (time limit {time_to_string(time_limit)})' if time_limit else ''))
+    for src, in_file, timing in slowest:
+        print(f'  {relativeCwd(src)} {relativeCwd(in_file)} {timing_to_string(timing, time_limit)}')
+
+def print_trace_summary(problems_root: Path, problem_name: str) -> None:
+    """
+    Prints where the time went per phase, and exports the trace of all phases.
+    """
+    total = TRACER.total()
+    totals = TRACER.category_totals()
+    # time not covered by any phase is chum's own bookkeeping (and printing)
+    totals['other'] = max(total - sum(totals.values()), 0)
+
+    print()
+    print(f'{BOLD}Trace{NULL}')
+    for category in ('discovery', 'compile', 'spawn', 'run', 'check', 'benchmark', 'other'):
+        if category in totals:
+            share = totals[category] / total * 100 if total else 0
+            print(f'  {category:12}{time_to_string(totals[category]):>14}  {share:5.1f} %')
+    print(f"  {'total':12}{time_to_string(total):>14}")
+
+    path = trace_path(problems_root, problem_name)
+    TRACER.export(path)
+    print(f"{DIMMED}Chrome trace written to '{path}'{NULL}")
+
+def resolve_problem_name(problems_root: Path, problem_name: str) -> str:
+    """
+    Returns the problem name, or the only problem matching it. Exits if there is no such problem.
+    """
+    if valid_problem_name(problems_root, problem_name):
+        return problem_name
+
+    problem_suggestions = match_problems_folder(problems_root, problem_name)
+
+    # auto-select problem
+    if len(problem_suggestions) == 1:
+        problem_name = problem_suggestions[0].name
+        print(f'No such problem exists, using only match: {problem_name}\n')
+        return problem_name
+
+    # print error with suggestions
+    print(f'No such problem exists: {(problems_root / problem_name).name}')
+    if len(problem_suggestions):
+        problems_string = '\n\t'.join(str(p.name) for p in problem_suggestions)
+        print(f'\nDid you mean any of:\n\t{problems_string}')
 
+    exit(1)
+
+def problem_test_dirs(problems_root: Path, problem_name: str) -> list[Path]:
     problem_dir = problems_root / problem_name
-    test_dir = problems_root / '.chumtests' / problem_name
-    test_dirs = [test_dir, problem_dir / 'test', problem_dir / 'tests']
-    ins_ans_pairs = get_ins_and_ans(test_dirs)
+    return [problems_root / '.chumtests' / problem_name, problem_dir / 'test', problem_dir / 'tests']
+
+def run_and_test(
+        problems_root: Path,
+        problem_name: str,
+        benchmark: bool,
+        benchmark_average: bool,
+        cleanup: bool = False,
+        fork_server: bool = False,
+        time_limit: float|None = None,
+        slowest: int = 3,
+        fail_fast: bool = False,
+        keep_order: bool = False) -> None:
+    with TRACER.span('discovery', 'discovery'):
+        problem_name = resolve_problem_name(problems_root, problem_name)
+
+        problem_dir = problems_root / problem_name
+        test_dirs = problem_test_dirs(problems_root, problem_name)
+        ins_ans_pairs = get_ins_and_ans(test_dirs)
+
+        check_create_tmp_dir()
+
+        interactor = find_interactor(problem_dir, ACCEPTED_SRC_SUFFIXES)
 
-    check_create_tmp_dir()
+        source_files = [s for s in get_source_files(problems_root, problem_name) if s != interactor]
 
-    source_files = get_source_files(problems_root, problem_name)
     sources_string = ', '.join(relativeCwd(src) for src in source_files)
     print(f'{DIMMED}Compiling source files: [{sources_string}]{NULL}')
 
     run_benchmark: bool = benchmark or benchmark_average
 
-    test_commands = []
+    test_commands: list[tuple[Path, str]] = []
     for s in source_files:
-        test_command = compile_and_get_test_command(s, problem_dir)
+        test_command = compile_and_get_test_command(problems_root, s, problem_dir)
         if test_command:
-            test_commands.append(test_command)
+            test_commands.append((s, test_command))
+
+    interactor_command = ''
+    if interactor:
+        interactor_command = compile_and_get_test_command(problems_root, interactor, problem_dir, f'{INTERACTOR_NAME}_{interactor.suffix[1:]}')
+        if not interactor_command:
+            exit(1)
+        interactor_command = command_without_redirection(interactor_command)
+        print(f'{DIMMED}Interactive problem, using interactor: {relativeCwd(interactor)}{NULL}')
+
+    if time_limit is None:
+        time_limit = configured_time_limit(problems_root)
+
+    stopped = False
+
+    if fork_server and not has_fork():
+        print(f'{YELLOW}--fork-server requires os.fork, running python tests in fresh processes{NULL}')
+        fork_server = False
 
     if not sum(1 for _ in ins_ans_pairs):
         test_folder_paths = "', \n\t'".join(str(t) for t in test_dirs)
@@ -445,40 +750,83 @@ def run_and_test(problems_root: Path, problem_name: str, benchmark: bool, benchm
     else:
         # tuples of name, test name, execution command
         benchmarks: list[BenchmarkTask] = []
+        all_timings: list[tuple[Path, str, TestTiming]] = []
         tests_string = ', '.join(relativeCwd(test) for test, _ in ins_ans_pairs)
         print(f'{DIMMED}Running tests: [{tests_string}]{NULL}')
         print()
 
-        for src_index, test_command in enumerate(test_commands):
-            src: Path = source_files[src_index]
-            success = [True for _ in ins_ans_pairs]
-            for i, (in_file, ans_file) in enumerate(ins_ans_pairs):
-                test_output_path = TMP_PATH / f'{src.stem}_{src.suffix[1:]}_{Path(in_file).stem}_output'
-                execution_cmd = test_command.format(relativeCwd(in_file), relativeCwd(test_output_path))
-                output = subprocess.run([f'({execution_cmd})'], shell=True, capture_output=True)
-                if output.returncode != 0: # execution error
-                    print()
-                    print(f"{RED}{relativeCwd(src)} ERROR WHILE RUNNING TEST '{relativeCwd(in_file)}'!{NULL}")
-                    print(output.stderr.decode("utf-8"))
-                    print(output.stdout.decode("utf-8"))
-                    print('while running:')
-                    print(f'{DIMMED}{execution_cmd}{NULL}')
-                    exit(1)
-                else: # no execution error
-                    success[i] = check_test(test_output_path, ans_file) and success[i]
+        history = load_history(problems_root, problem_name)
+        test_names = [str(Path(in_file).relative_to(problems_root)) for in_file, _ in ins_ans_pairs]
+        tests_run = 0
 
-                    if run_benchmark:
-                        benchmarks.append(BenchmarkTask(src.name, in_file, execution_cmd))
+        if not keep_order:
+            source_order = schedule_sources(history, [src.name for src, _ in test_commands], test_names)
+            test_commands = [test_commands[i] for i in source_order]
 
-            print(f'{BLUE}{relativeCwd(src)}{NULL}')
-            for i, s in enumerate(success):
-                in_path: str = relativeCwd(ins_ans_pairs[i][0])
-                if s:
-                    print(f'{GREEN}  ✔ - PASSED{NULL} {in_path}')
+        try:
+            for src, test_command in test_commands:
+                server: ForkServer|None = None
+                if fork_server and src.suffix == '.py' and not interactor_command:
+                    server = ForkServer(PYTHON_COMPILE_FLAGS)
+
+                if keep_order:
+                    order = list(range(len(ins_ans_pairs)))
                 else:
-                    print(f'{RED}  ✗ - FAILED{NULL} {in_path}')
+                    order = schedule_tests(history, src.name, test_names)
+
+                success = [True for _ in ins_ans_pairs]
+                notes = ['' for _ in ins_ans_pairs]
+                timings: list[TestTiming|None] = [None for _ in ins_ans_pairs]
+                ran: list[int] = []
+                for i in order:
+                    in_file, ans_file = ins_ans_pairs[i]
+                    try:
+                        success[i], notes[i], timings[i], execution_cmd = run_single_test(src, test_command, interactor_command, server, in_file, ans_file)
+                    except SystemExit:
+                        # execution errors exit
+                        record_result(history, src.name, test_names[i], False, None)
+                        raise
+
+                    ran.append(i)
+                    tests_run += 1
+                    record_result(history, src.name, test_names[i], success[i], timings[i].wall_time)
 
-        if run_benchmark:
+                    if run_benchmark:
+                        if interactor_command:
+                            benchmarks.append(BenchmarkTask(src.name, in_file, test_command, interactor_command, ans_file))
+                        else:
+                            benchmarks.append(BenchmarkTask(src.name, in_file, execution_cmd))
+
+                    if fail_fast and not success[i]:
+                        stopped = True
+                        break
+
+                if server:
+                    server.close()
+
+                print(f'{BLUE}{relativeCwd(src)}{NULL}')
+                for i in ran:
+                    in_path: str = relativeCwd(ins_ans_pairs[i][0])
+                    note = f' {DIMMED}{notes[i]}{NULL}' if notes[i] else ''
+                    timing = f' {timing_to_string(timings[i], time_limit)}' if timings[i] else ''
+                    if success[i]:
+                        print(f'{GREEN}  ✔ - PASSED{NULL} {in_path}{timing}{note}')
+                    else:
+                        print(f'{RED}  ✗ - FAILED{NULL} {in_path}{timing}{note}')
+
+                all_timings += [(src, ins_ans_pairs[i][0], timings[i]) for i in ran if timings[i]]
+
+                if stopped:
+                    print()
+                    print(f'{YELLOW}Stopped at first failure (--fail-fast), {len(test_commands) * len(ins_ans_pairs) - tests_run} tests not run{NULL}')
+                    break
+        finally:
+            save_history(problems_root, problem_name, history)
+
+        if slowest > 0 and len(all_timings) > slowest and not stopped:
+            print_slowest_tests(all_timings, slowest, time_limit)
+
+        if run_benchmark and not stopped:
             print()
 
             if not has_hyperfine():
@@ -495,9 +843,10 @@ def run_and_test(problems_root: Path, problem_name: str, benchmark: bool, benchm
 
     # cleanup
     if cleanup:
-        for x in TMP_PATH.iterdir():
-            x.unlink()
-        TMP_PATH.rmdir()
+        shutil.rmtree(TMP_PATH)
     else:
         print()
         print(f"See output files: '{TMP_PATH.relative_to(Path.cwd())}'")
+
+    if stopped:
+        exit(1)
@@ -0,0 +1,186 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+Test data discovery and reading, for plain, compressed (.gz, .zst) and zip archived test files.
+
+Tests inside a zip archive are referred to by the archive path followed by the member name,
+e.g. 'tests/secret.zip/group1/01.in'. Compressed and archived data is streamed, never extracted.
+"""
+
+import atexit
+import gzip
+import hashlib
+import io
+import shutil
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO
+
+INPUT_SUFFIXES = ('.in',)
+ANSWER_SUFFIXES = ('.ans', '.out')
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+ARCHIVE_SUFFIX = '.zip'
+
+# archives are opened once per run, as opening one reads its whole member list
+ARCHIVES: dict[Path, zipfile.ZipFile] = {}
+
+def split_compression(name: str) -> tuple[str, str]:
+    """
+    Splits 'sample1.in.gz' into ('sample1.in', '.gz').
+    """
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)], suffix
+    return name, ''
+
+def test_stem(path: str | Path) -> str:
+    """
+    Name of the test, without directories, test file suffix and compression suffix.
+    """
+    name, _ = split_compression(Path(path).name)
+    return Path(name).stem
+
+def split_archive_path(path: str | Path) -> tuple[Path, str]|None:
+    """
+    Returns the archive and member name if the path points into a zip archive.
+    """
+    path = Path(path)
+    for parent in path.parents:
+        if parent.suffix == ARCHIVE_SUFFIX and is_archive(parent):
+            return parent, path.relative_to(parent).as_posix()
+    return None
+
+@lru_cache
+def is_archive(path: Path) -> bool:
+    return path.suffix == ARCHIVE_SUFFIX and path.is_file()
+
+def open_archive(archive: Path) -> zipfile.ZipFile:
+    """
+    Returns the opened archive, kept open until the run ends.
+    """
+    if not ARCHIVES:
+        atexit.register(close_archives)
+    if archive not in ARCHIVES:
+        ARCHIVES[archive] = zipfile.ZipFile(archive)
+    return ARCHIVES[archive]
+
+def close_archives() -> None:
+    for archive in ARCHIVES.values():
+        archive.close()
+    ARCHIVES.clear()
+
+class OwningGzipFile(gzip.GzipFile):
+    """
+    Gzip file that closes the stream it reads from when closed, unlike GzipFile(fileobj=...).
+    """
+    def __init__(self, stream: BinaryIO):
+        super().__init__(fileobj=stream, mode='rb')
+        self.stream = stream
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self.stream.close()
+
+def is_plain_file(path: str | Path) -> bool:
+    """
+    Whether the test file can be read directly from disk, e.g. by shell redirection.
+    """
+    return split_compression(str(path))[1] == '' and split_archive_path(path) is None
+
+def decompress(stream: BinaryIO, compression: str) -> BinaryIO:
+    """
+    Decompressing reader of the stream, closing the stream when closed.
+    """
+    if compression == '.gz':
+        return OwningGzipFile(stream)
+    elif compression == '.zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception('Reading .zst test data requires the python package `zstandard`')
+        return zstandard.ZstdDecompressor().stream_reader(stream, closefd=True)
+    return stream
+
+def open_test_file(path: str | Path) -> BinaryIO:
+    """
+    Opens a test file for streamed binary reading.
+    """
+    _, compression = split_compression(str(path))
+
+    archived = split_archive_path(path)
+    if archived:
+        archive, member = archived
+        return decompress(open_archive(archive).open(member), compression)
+    elif compression == '.gz':
+        return gzip.open(path, 'rb')
+    return decompress(open(path, 'rb'), compression)
+
+def open_test_text(path: str | Path) -> io.TextIOBase:
+    if is_plain_file(path):
+        return open(path, 'r')
+    return io.TextIOWrapper(open_test_file(path))
+
+def plain_test_file(path: str, directory: Path) -> str:
+    """
+    Returns a path to the test data on disk, decompressing it into directory if needed. Only for programs
+    that need a real file, like hyperfine and interactors.
+    """
+    if is_plain_file(path):
+        return path
+
+    key = hashlib.sha1(path.encode()).hexdigest()[:12]
+    plain_path = directory / f'{test_stem(path)}_{key}{Path(split_compression(path)[0]).suffix}'
+    if not plain_path.is_file():
+        with open_test_file(path) as source, open(plain_path, 'wb') as destination:
+            shutil.copyfileobj(source, destination)
+    return str(plain_path)
+
+def test_kind(name: str) -> str|None:
+    """
+    'in' or 'ans' depending on the test file name, None if it is not a test file.
+    """
+    suffix = Path(split_compression(name)[0]).suffix
+    if suffix in INPUT_SUFFIXES:
+        return 'in'
+    elif suffix in ANSWER_SUFFIXES:
+        return 'ans'
+    return None
+
+def test_files(test_dir: Path) -> list[str]:
+    """
+    Test files in the directory and in the zip archives in it.
+    """
+    files = []
+    for f in test_dir.iterdir():
+        if is_archive(f):
+            files += [str(f / m) for m in open_archive(f).namelist() if not m.endswith('/')]
+        elif f.is_file():
+            files.append(str(f))
+    return files
+
+def find_tests(test_dirs: list[Path]) -> list[tuple[str, str]]:
+    """
+    Pairs of test input and answer, sorted by input path. Inputs without answers are left out, and
+    '.ans' is preferred over '.out'.
+    """
+    ins: dict[str, str] = {}
+    ans: dict[str, str] = {}
+
+    for d in test_dirs:
+        if not d.is_dir():
+            continue
+        for f in test_files(d):
+            kind = test_kind(f)
+            # tests are matched by directory (or archive directory) and stem
+            key = str(Path(f).parent / test_stem(f))
+            if kind == 'in':
+                ins[key] = f
+            elif kind == 'ans' and (key not in ans or Path(split_compression(f)[0]).suffix == '.ans'):
+                ans[key] = f
+
+    return sorted((ins[key], ans[key]) for key in ins if key in ans)
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+
+"""
+Phase timing of chum itself, printed as a summary and exported in the chrome trace event format
+(open in chrome://tracing or https://ui.perfetto.dev).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.start = time.perf_counter()
+        # (name, category, start, duration, thread id, args), times in seconds since self.start
+        self.events: list[tuple[str, str, float, float, int, dict]] = []
+        self.lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.start = time.perf_counter()
+        self.events = []
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.events.append((name, category, start - self.start, end - start, threading.get_ident(), args))
+
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def category_totals(self) -> dict[str, float]:
+        totals: dict[str, float] = {}
+        for _, category, _, duration, _, _ in self.events:
+            totals[category] = totals.get(category, 0) + duration
+        return totals
+
+    def export(self, path: Path) -> None:
+        pid = os.getpid()
+        trace_events = [
+            {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': start * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': tid,
+                'args': args,
+            }
+            for name, category, start, duration, tid, args in self.events
+        ]
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+TRACER = Tracer()
+
+def trace_path(problems_root: Path, problem_name: str) -> Path:
+    return problems_root / '.chum' / 'traces' / f'{problem_name}.json'